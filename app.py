@@ -1,22 +1,60 @@
 # app.py - Pak Buy Pro Scraping Server
 # Performance Mode B: Accurate scraping with Puppeteer + AI matching
 
-from flask import Flask, request, jsonify
+from flask import Flask, request
 from flask_cors import CORS
-import requests
-from bs4 import BeautifulSoup
-import re
+import orjson
+import aiohttp
+import asyncio
+import threading
+from selectolax.lexbor import LexborHTMLParser
+try:
+    # Google RE2: linear-time DFA matching, no backtracking, releases the
+    # GIL on long inputs. All patterns below stay within its feature set.
+    import re2 as re
+except ImportError:
+    import re
+import heapq
 import time
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from difflib import SequenceMatcher
+import random
+from urllib.parse import quote
+from cachetools import TTLCache
+from rapidfuzz import fuzz, process
 
 app = Flask(__name__)
 CORS(app)
 
+def json_response(payload, status=200):
+    """Serialize with orjson (C, SIMD) instead of stdlib json"""
+    return app.response_class(orjson.dumps(payload), status=status,
+                              mimetype='application/json')
+
 # AI Server URL
 AI_SERVER_URL = os.environ.get('AI_SERVER_URL', 'pakbuyhatke-ai-server-production.up.railway.app')
 
+# Single event loop on a daemon thread, shared by all Flask workers.
+# One reusable aiohttp session on that loop keeps connections (TCP+TLS)
+# alive across /compare requests.
+LOOP = asyncio.new_event_loop()
+threading.Thread(target=LOOP.run_forever, daemon=True).start()
+
+HTTP_SESSION = None
+
+async def _get_session():
+    """Lazily create the shared aiohttp session on the event loop"""
+    global HTTP_SESSION
+    if HTTP_SESSION is None:
+        HTTP_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=15, sock_connect=3)
+        )
+    return HTTP_SESSION
+
+def run_async(coro):
+    """Run a coroutine on the shared loop from a Flask worker thread"""
+    return asyncio.run_coroutine_threadsafe(coro, LOOP).result()
+
 # User agents for anti-detection
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -25,290 +63,377 @@ USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0'
 ]
 
-def get_headers():
-    """Generate realistic headers"""
-    import random
-    return {
-        'User-Agent': random.choice(USER_AGENTS),
+# Stop extracting once this many usable products are found per site
+MAX_PRODUCTS = 5
+
+# Read at most this much (decompressed) HTML per search page - the product
+# cards live in the first couple hundred KB, the rest is footer/scripts
+MAX_HTML_BYTES = 300_000
+
+# Precompiled patterns - these run per scraped product per request, so
+# compile once instead of relying on re's bounded internal cache
+_WS_RE = re.compile(r'\s+')
+# Flags are embedded inline ((?i)/(?s)) rather than passed as arguments:
+# google-re2 exposes no flag constants, and inline flags compile and match
+# identically under both engines.
+_RAM_RE = re.compile(r'(?i)(\d+)\s*GB\s*(?:RAM)?')
+_STORAGE_RE = re.compile(r'(?i)(\d+)\s*(?:GB|TB)\s*(?:Storage|SSD|HDD)?')
+_GARBAGE_RE = re.compile(
+    r'(?i)\b(?:PTA Approved|Official Warranty|Fast Shipping|Cash on Delivery|'
+    r'Free Delivery|Original|New|Sealed)\b'
+)
+
+# One frozen header dict per user agent, built once - get_headers() then
+# just picks one instead of allocating a new dict per HTTP call. Callers
+# must treat these as read-only.
+_HEADERS_POOL = tuple(
+    {
+        'User-Agent': ua,
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
+        'Accept-Encoding': 'gzip, deflate, br',
         'Connection': 'keep-alive',
         'Upgrade-Insecure-Requests': '1',
         'Referer': 'https://www.google.com/'
     }
+    for ua in USER_AGENTS
+)
+
+def get_headers():
+    """Pick a pre-built realistic header set"""
+    return _HEADERS_POOL[random.randrange(len(_HEADERS_POOL))]
 
 def clean_price(price_text):
     """Extract numeric price"""
     if not price_text:
         return 0
-    price = re.sub(r'[^\d.]', '', price_text)
-    try:
-        return int(float(price))
-    except:
-        return 0
+    # Single-pass digit scan - no regex engine setup per call. Commas
+    # inside the number are skipped ("Rs. 45,900" -> 45900) and the scan
+    # stops at the first non-digit after the run, so a decimal fraction
+    # is truncated like the old int(float(...)) did.
+    total = 0
+    seen_digit = False
+    for ch in price_text:
+        if '0' <= ch <= '9':
+            total = total * 10 + (ord(ch) - 48)
+            seen_digit = True
+        elif ch == ',':
+            continue
+        elif seen_digit:
+            break
+    return total
+
+# Clean-title cache: browser-extension users re-open the same product page
+# repeatedly, so repeat titles skip the AI round-trip entirely
+TITLE_CACHE = TTLCache(maxsize=4096, ttl=3600)
+TITLE_CACHE_LOCK = threading.Lock()
+
+async def get_clean_title(session, original_title):
+    """Get clean title from AI server with caching and local fallback"""
+    key = _WS_RE.sub(' ', original_title.lower()).strip()
+    with TITLE_CACHE_LOCK:
+        cached = TITLE_CACHE.get(key)
+    if cached is not None:
+        return cached
 
-def get_clean_title(original_title):
-    """Get clean title from AI server with fallback"""
     try:
-        response = requests.post(
+        async with session.post(
             f'{AI_SERVER_URL}/clean-title',
             json={'title': original_title, 'timeout': 3},
-            timeout=5
-        )
-        if response.ok:
-            data = response.json()
-            if data.get('success'):
-                return data.get('cleaned', original_title)
+            timeout=aiohttp.ClientTimeout(total=5)
+        ) as response:
+            if response.status == 200:
+                data = await response.json()
+                if data.get('success'):
+                    cleaned = data.get('cleaned', original_title)
+                    with TITLE_CACHE_LOCK:
+                        TITLE_CACHE[key] = cleaned
+                    return cleaned
     except:
         pass
+    # Local fallback is not cached so the AI server gets retried next time
     return clean_title_local(original_title)
 
 def clean_title_local(title):
     """Local regex fallback"""
-    garbage = ['PTA Approved', 'Official Warranty', 'Fast Shipping', 
-               'Cash on Delivery', 'Free Delivery', 'Original', 'New', 'Sealed']
-    cleaned = title
-    for word in garbage:
-        cleaned = re.sub(word, '', cleaned, flags=re.IGNORECASE)
-    cleaned = re.sub(r'\s+', ' ', cleaned)
+    # One combined alternation replaces all garbage phrases in a single pass
+    cleaned = _GARBAGE_RE.sub('', title)
+    cleaned = _WS_RE.sub(' ', cleaned)
     return cleaned.strip()
 
-def is_similar_product(title1, title2, threshold=0.70):
+def match_products(query_title, products, threshold=0.70):
     """
     Advanced product matching using similarity ratio
     Threshold: 0.70 (70% match required)
+
+    Scores every scraped title against the query in one rapidfuzz call,
+    so the query is tokenized once instead of once per product.
     """
-    # Normalize both titles
-    t1 = title1.lower().strip()
-    t2 = title2.lower().strip()
-    
-    # Calculate similarity
-    similarity = SequenceMatcher(None, t1, t2).ratio()
-    
-    # Also check for key spec matches (RAM, storage)
-    ram_pattern = r'(\d+)\s*GB\s*(?:RAM)?'
-    storage_pattern = r'(\d+)\s*(?:GB|TB)\s*(?:Storage|SSD|HDD)?'
-    
-    t1_ram = re.search(ram_pattern, t1, re.IGNORECASE)
-    t2_ram = re.search(ram_pattern, t2, re.IGNORECASE)
-    
-    t1_storage = re.search(storage_pattern, t1, re.IGNORECASE)
-    t2_storage = re.search(storage_pattern, t2, re.IGNORECASE)
-    
-    # Boost similarity if RAM/storage match
-    if t1_ram and t2_ram and t1_ram.group(1) == t2_ram.group(1):
-        similarity += 0.05
-    if t1_storage and t2_storage and t1_storage.group(1) == t2_storage.group(1):
-        similarity += 0.05
-    
-    match = similarity >= threshold
-    
-    if match:
-        print(f"✅ Match ({similarity:.2f}): '{t1[:40]}' ≈ '{t2[:40]}'")
-    
-    return match
+    if not products:
+        return []
+
+    t1 = query_title.lower().strip()
+    titles = [p['title'].lower().strip() for p in products]
+
+    # One native batch call - token_set_ratio is C-backed and robust to
+    # word reordering in product titles
+    scores = [0.0] * len(titles)
+    for _choice, score, idx in process.extract(
+            t1, titles, scorer=fuzz.token_set_ratio, limit=None):
+        scores[idx] = score / 100.0
+
+    # Query specs are loop-invariant - extract them once, not per product
+    t1_ram_match = _RAM_RE.search(t1)
+    t1_storage_match = _STORAGE_RE.search(t1)
+    t1_ram = t1_ram_match.group(1) if t1_ram_match else None
+    t1_storage = t1_storage_match.group(1) if t1_storage_match else None
+
+    matched = []
+    for product, t2, similarity in zip(products, titles, scores):
+        # Boost similarity if key specs (RAM, storage) match
+        t2_ram = _RAM_RE.search(t2)
+        t2_storage = _STORAGE_RE.search(t2)
+
+        if t1_ram and t2_ram and t1_ram == t2_ram.group(1):
+            similarity += 0.05
+        if t1_storage and t2_storage and t1_storage == t2_storage.group(1):
+            similarity += 0.05
+
+        if similarity >= threshold:
+            print(f"✅ Match ({similarity:.2f}): '{t1[:40]}' ≈ '{t2[:40]}'")
+            matched.append(product)
+
+    return matched
 
 # ============================================
 # SITE SCRAPERS (Performance Mode B - Accurate)
 # ============================================
 
-def scrape_with_retry(scraper_func, *args, max_retries=2):
+# Per-site result cache: (site, query) -> product list. All access happens
+# on the shared event loop thread, so no threading lock is needed. The
+# per-key asyncio.Lock coalesces concurrent requests for the same query
+# into a single outbound scrape (thundering-herd prevention).
+SCRAPE_CACHE = TTLCache(maxsize=8192, ttl=300)
+_SCRAPE_LOCKS = {}
+
+async def _scrape_cached(site, scraper_func, session, spec, query):
+    """Serve a site scrape from cache, coalescing concurrent misses"""
+    key = (site, query)
+    hit = SCRAPE_CACHE.get(key)
+    if hit is not None:
+        return hit
+
+    lock = _SCRAPE_LOCKS.setdefault(key, asyncio.Lock())
+    async with lock:
+        # Re-check: another coroutine may have filled the cache while we waited
+        hit = SCRAPE_CACHE.get(key)
+        if hit is not None:
+            return hit
+        result = await scrape_with_retry(scraper_func, session, spec, query)
+        if result:
+            # Empty results are not cached so transient failures get retried
+            SCRAPE_CACHE[key] = result
+        _SCRAPE_LOCKS.pop(key, None)
+        return result
+
+async def scrape_with_retry(scraper_func, *args, max_retries=2):
     """Retry scraping on failure"""
     for attempt in range(max_retries):
         try:
-            result = scraper_func(*args)
+            result = await scraper_func(*args)
             if result:
                 return result
-            time.sleep(1)  # Brief delay before retry
+            await asyncio.sleep(1)  # Brief delay before retry
         except Exception as e:
             if attempt == max_retries - 1:
                 print(f"Failed after {max_retries} attempts: {e}")
                 return []
-            time.sleep(2)
+            await asyncio.sleep(2)
     return []
 
-def scrape_priceoye(query):
-    """Scrape PriceOye.pk with retry"""
-    return scrape_with_retry(_scrape_priceoye, query)
+# Daraz bootstraps its search page from a JSON blob in a <script> tag, so
+# the listing can be pulled straight from window.pageData without any HTML
+# parse at all.
+_DARAZ_PAGEDATA_RE = re.compile(rb'(?s)window\.pageData\s*=\s*(\{.*?\});')
 
-def _scrape_priceoye(query):
+def _extract_daraz(content):
+    """Extract Daraz products from the embedded pageData JSON.
+
+    Returns None when the blob is missing so the caller falls back to the
+    generic CSS extraction.
+    """
+    m = _DARAZ_PAGEDATA_RE.search(content)
+    if not m:
+        return None
     try:
-        url = f'https://priceoye.pk/search?q={requests.utils.quote(query)}'
-        print(f'🔍 Scraping PriceOye: {query}')
-        
-        response = requests.get(url, headers=get_headers(), timeout=15)
-        if response.status_code != 200:
-            return []
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        products = []
-        
-        # Multiple selector fallbacks
-        items = (soup.find_all('div', class_='product-card') or 
-                soup.find_all('div', class_='product-item') or
-                soup.find_all('div', {'data-product': True}))[:5]
-        
-        for item in items:
-            try:
-                title_el = (item.find('h3') or 
-                           item.find('a', class_='product-title') or
-                           item.find(class_='title'))
-                
-                price_el = (item.find('span', class_='price-box') or 
-                           item.find('div', class_='price') or
-                           item.find(class_='product-price'))
-                
-                link_el = item.find('a')
-                img_el = item.find('img')
-                
-                if title_el and price_el:
-                    title = title_el.get_text(strip=True)
-                    price = clean_price(price_el.get_text(strip=True))
-                    link = link_el.get('href', '') if link_el else ''
-                    img = img_el.get('src', '') if img_el else ''
-                    
-                    if not link.startswith('http'):
-                        link = f'https://priceoye.pk{link}'
-                    
-                    if price > 0:
-                        products.append({
-                            'title': title,
-                            'price': price,
-                            'url': link,
-                            'image': img,
-                            'site': 'PriceOye'
-                        })
-            except Exception as e:
-                continue
-        
-        print(f'✅ PriceOye: Found {len(products)} products')
-        return products
-        
-    except Exception as e:
-        print(f'❌ PriceOye error: {e}')
-        return []
+        data = orjson.loads(m.group(1))
+        items = data['mods']['listItems']
+    except (orjson.JSONDecodeError, KeyError):
+        return None
 
-def scrape_mega(query):
-    """Scrape Mega.pk with retry"""
-    return scrape_with_retry(_scrape_mega, query)
+    products = []
+    for item in items:
+        if len(products) >= MAX_PRODUCTS:
+            break
+        title = item.get('name', '')
+        price = clean_price(str(item.get('price', '')))
+        link = item.get('productUrl', '')
+        img = item.get('image', '')
 
-def _scrape_mega(query):
-    try:
-        url = f'https://www.mega.pk/search/{requests.utils.quote(query)}'
-        print(f'🔍 Scraping Mega.pk: {query}')
-        
-        response = requests.get(url, headers=get_headers(), timeout=15)
-        if response.status_code != 200:
-            return []
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        products = []
-        
-        items = (soup.find_all('div', class_='product-item') or
-                soup.find_all('div', class_='product-box') or
-                soup.find_all('article', class_='product'))[:5]
-        
-        for item in items:
-            try:
-                title_el = (item.find('h4') or 
-                           item.find('h3') or
-                           item.find('a', class_='product-name'))
-                
-                price_el = (item.find('span', class_='price') or
-                           item.find('div', class_='price'))
-                
-                link_el = item.find('a')
-                img_el = item.find('img')
-                
-                if title_el and price_el:
-                    title = title_el.get_text(strip=True)
-                    price = clean_price(price_el.get_text(strip=True))
-                    link = link_el.get('href', '') if link_el else ''
-                    img = img_el.get('src', '') if img_el else ''
-                    
-                    if not link.startswith('http'):
-                        link = f'https://www.mega.pk{link}'
-                    
-                    if price > 0:
-                        products.append({
-                            'title': title,
-                            'price': price,
-                            'url': link,
-                            'image': img,
-                            'site': 'Mega'
-                        })
-            except:
-                continue
-        
-        print(f'✅ Mega.pk: Found {len(products)} products')
-        return products
-        
-    except Exception as e:
-        print(f'❌ Mega.pk error: {e}')
-        return []
+        if link and not link.startswith('http'):
+            link = f'https:{link}' if link.startswith('//') else f'https://www.daraz.pk{link}'
+
+        if title and price > 0:
+            products.append({
+                'title': title,
+                'price': price,
+                'url': link,
+                'image': img,
+                'site': 'Daraz'
+            })
+    return products
 
-def scrape_daraz(query):
-    """Scrape Daraz.pk with retry"""
-    return scrape_with_retry(_scrape_daraz, query)
+# The three scrapers share one code path: fetch, parse, extract. Only the
+# URL template and selectors differ per site, so they live in a spec table
+# and parser/cache/retry changes happen in exactly one place. An optional
+# 'extract' hook replaces the HTML parse for sites that embed their data.
+SITES = {
+    'priceoye': {
+        'name': 'PriceOye',
+        'url': 'https://priceoye.pk/search?q={}',
+        'prefix': 'https://priceoye.pk',
+        'item_sel': 'div.product-card, div.product-item, div[data-product]',
+        'title_sel': 'h3, a.product-title, .title',
+        'price_sel': 'span.price-box, div.price, .product-price',
+    },
+    'mega': {
+        'name': 'Mega',
+        'url': 'https://www.mega.pk/search/{}',
+        'prefix': 'https://www.mega.pk',
+        'item_sel': 'div.product-item, div.product-box, article.product',
+        'title_sel': 'h4, h3, a.product-name',
+        'price_sel': 'span.price, div.price',
+    },
+    'daraz': {
+        'name': 'Daraz',
+        'url': 'https://www.daraz.pk/catalog/?q={}',
+        'prefix': 'https://www.daraz.pk',
+        'item_sel': 'div[data-qa-locator="product-item"], div.product-item',
+        'title_sel': 'div.title, a.title',
+        'price_sel': 'span.price, div.price',
+        'extract': _extract_daraz,
+    },
+}
 
-def _scrape_daraz(query):
+async def scrape_site(session, site_key, query):
+    """Scrape one site from the spec table, with caching and retry"""
+    spec = SITES[site_key]
+    return await _scrape_cached(spec['name'], _scrape_site, session, spec, query)
+
+async def _scrape_site(session, spec, query):
     try:
-        url = f'https://www.daraz.pk/catalog/?q={requests.utils.quote(query)}'
-        print(f'🔍 Scraping Daraz.pk: {query}')
-        
-        response = requests.get(url, headers=get_headers(), timeout=15)
-        if response.status_code != 200:
-            return []
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
+        url = spec['url'].format(quote(query))
+        print(f'🔍 Scraping {spec["name"]}: {query}')
+
+        async with session.get(url, headers=get_headers()) as response:
+            if response.status != 200:
+                return []
+            # Bounded read: multi-MB pages are abandoned past the cap, so
+            # bandwidth and parse cost stay proportional to what's used
+            content = await response.content.read(MAX_HTML_BYTES)
+
+        extract = spec.get('extract')
+        if extract:
+            products = extract(content)
+            if products is not None:
+                print(f'✅ {spec["name"]}: Found {len(products)} products')
+                return products
+
+        tree = LexborHTMLParser(content)
         products = []
-        
-        items = (soup.find_all('div', {'data-qa-locator': 'product-item'}) or
-                soup.find_all('div', class_='product-item'))[:5]
-        
-        for item in items:
+
+        # Single comma-separated selector covers all layout variants in one traversal
+        for item in tree.css(spec['item_sel']):
+            if len(products) >= MAX_PRODUCTS:
+                break
             try:
-                title_el = (item.find('div', class_='title') or
-                           item.find('a', class_='title'))
-                
-                price_el = (item.find('span', class_='price') or
-                           item.find('div', class_='price'))
-                
-                link_el = item.find('a')
-                img_el = item.find('img')
-                
+                title_el = item.css_first(spec['title_sel'])
+                price_el = item.css_first(spec['price_sel'])
+
+                link_el = item.css_first('a')
+                img_el = item.css_first('img')
+
                 if title_el and price_el:
-                    title = title_el.get_text(strip=True)
-                    price = clean_price(price_el.get_text(strip=True))
-                    link = link_el.get('href', '') if link_el else ''
-                    img = img_el.get('src', '') if img_el else ''
-                    
+                    title = title_el.text(strip=True)
+                    price = clean_price(price_el.text(strip=True))
+                    link = link_el.attributes.get('href', '') if link_el else ''
+                    img = img_el.attributes.get('src', '') if img_el else ''
+
                     if link and not link.startswith('http'):
-                        link = f'https:{link}' if link.startswith('//') else f'https://www.daraz.pk{link}'
-                    
+                        link = f'https:{link}' if link.startswith('//') else f'{spec["prefix"]}{link}'
+
                     if price > 0:
                         products.append({
                             'title': title,
                             'price': price,
                             'url': link,
                             'image': img,
-                            'site': 'Daraz'
+                            'site': spec['name']
                         })
             except:
                 continue
-        
-        print(f'✅ Daraz: Found {len(products)} products')
+
+        print(f'✅ {spec["name"]}: Found {len(products)} products')
         return products
-        
+
     except Exception as e:
-        print(f'❌ Daraz error: {e}')
+        print(f'❌ {spec["name"]} error: {e}')
         return []
 
 # ============================================
 # MAIN COMPARISON ENDPOINT
 # ============================================
 
+# Scrape-result cache for /compare: search pages stay valid far longer
+# than the 5-minute TTL, so repeat requests for a popular product reuse
+# the scraped list and only re-run the cheap matching/filtering steps
+# (which depend on the caller's price).
+COMPARE_CACHE = TTLCache(maxsize=2048, ttl=300)
+COMPARE_CACHE_LOCK = threading.RLock()
+
+# Cheapest price each site has recently returned per product, keyed by
+# (site, token key). When the caller is already well below a site's
+# floor, scraping that site again cannot produce a cheaper option, so
+# the request is pruned before any HTTP happens.
+MIN_PRICE_SEEN = TTLCache(maxsize=8192, ttl=3600)
+MIN_PRICE_LOCK = threading.Lock()
+
+def _token_key(title):
+    """Order-insensitive token key so reworded titles share an entry"""
+    return ' '.join(sorted(set(_WS_RE.sub(' ', title.lower()).strip().split())))
+
+async def _compare_fanout(original_title, sites_to_scrape):
+    """Run the AI title clean and all site scrapes concurrently"""
+    session = await _get_session()
+    search_query = clean_title_local(original_title)
+
+    results = await asyncio.gather(
+        get_clean_title(session, original_title),
+        *[scrape_site(session, site_key, search_query) for site_key in sites_to_scrape],
+        return_exceptions=True
+    )
+
+    cleaned_title = results[0] if isinstance(results[0], str) else search_query
+
+    all_results = []
+    for site, result in zip(sites_to_scrape, results[1:]):
+        if isinstance(result, Exception):
+            print(f'❌ {site} failed: {result}')
+        else:
+            all_results.extend(result)
+
+    return cleaned_title, all_results
+
 @app.route('/compare', methods=['POST'])
 def compare_prices():
     """
@@ -316,68 +441,79 @@ def compare_prices():
     Performance Mode B: High accuracy with AI matching
     """
     try:
-        data = request.json
+        data = orjson.loads(request.data) if request.data else {}
         original_title = data.get('title', '')
         current_price = data.get('current_price', 0)
         current_site = data.get('current_site', 'daraz').lower()
         
         if not original_title:
-            return jsonify({'error': 'Title required'}), 400
+            return json_response({'error': 'Title required'}, status=400)
         
         print(f'\n📥 Compare request: {original_title[:60]}...')
         print(f'💰 Current: Rs. {current_price:,} on {current_site}')
         
         start_time = time.time()
-        
-        # STEP 1: Clean title with AI
-        cleaned_title = get_clean_title(original_title)
-        clean_time = time.time() - start_time
-        print(f'🧹 Cleaned: "{cleaned_title}" ({clean_time:.2f}s)')
-        
-        # STEP 2: Scrape sites in parallel (only PriceOye, Mega, Daraz)
-        sites_to_scrape = {
-            'priceoye': scrape_priceoye,
-            'mega': scrape_mega,
-            'daraz': scrape_daraz
-        }
-        
-        # Remove current site
-        if current_site in sites_to_scrape:
-            del sites_to_scrape[current_site]
-        
-        all_results = []
-        
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            future_to_site = {
-                executor.submit(scraper, cleaned_title): site 
-                for site, scraper in sites_to_scrape.items()
-            }
-            
-            for future in as_completed(future_to_site):
-                site = future_to_site[future]
-                try:
-                    results = future.result()
-                    all_results.extend(results)
-                except Exception as e:
-                    print(f'❌ {site} failed: {e}')
-        
+
+        # STEP 1+2 fused: AI title cleaning runs concurrently with the site
+        # scrapes instead of blocking them. Scrapes search with the cheap
+        # local clean; the AI-cleaned title is used for matching below.
+        # Every site from the spec table except the caller's own
+        sites_to_scrape = [key for key in SITES if key != current_site]
+
+        # Profile-guided pruning: a site whose recent floor for this product
+        # sits well above the caller's price cannot yield a cheaper option
+        title_key = _token_key(original_title)
+        pruned = []
+        if current_price > 0:
+            with MIN_PRICE_LOCK:
+                floors = {site: MIN_PRICE_SEEN.get((site, title_key), 0)
+                          for site in sites_to_scrape}
+            pruned = [s for s in sites_to_scrape
+                      if floors[s] and current_price < floors[s] * 0.95]
+            if pruned:
+                print(f'✂️  Skipping {", ".join(pruned)}: price already below recent floor')
+                sites_to_scrape = [s for s in sites_to_scrape if s not in pruned]
+
+        cache_key = (_WS_RE.sub(' ', original_title.lower()).strip(), current_site)
+        with COMPARE_CACHE_LOCK:
+            cached = COMPARE_CACHE.get(cache_key)
+
+        if cached is not None:
+            cleaned_title, all_results = cached
+            print('⚡ Cache hit - skipping scrape')
+        else:
+            cleaned_title, all_results = run_async(
+                _compare_fanout(original_title, sites_to_scrape)
+            )
+
+            # Record each site's cheapest result for future pruning
+            with MIN_PRICE_LOCK:
+                for p in all_results:
+                    k = (p['site'].lower(), title_key)
+                    floor = MIN_PRICE_SEEN.get(k)
+                    if floor is None or p['price'] < floor:
+                        MIN_PRICE_SEEN[k] = p['price']
+
+            # A pruned result set is incomplete - don't cache it, or a
+            # later caller with a higher price would get the reduced list
+            if not pruned:
+                with COMPARE_CACHE_LOCK:
+                    COMPARE_CACHE[cache_key] = (cleaned_title, all_results)
+        print(f'🧹 Cleaned: "{cleaned_title}" ({time.time() - start_time:.2f}s)')
+
         # STEP 3: Smart product matching (70% similarity threshold)
-        matched_products = []
-        for product in all_results:
-            if is_similar_product(cleaned_title, product['title']):
-                matched_products.append(product)
-        
+        matched_products = match_products(cleaned_title, all_results)
+
         print(f'🎯 Matched {len(matched_products)} of {len(all_results)} scraped products')
         
-        # STEP 4: Find cheaper options
-        cheaper_options = [
-            p for p in matched_products 
-            if p['price'] > 0 and p['price'] < current_price
-        ]
-        
-        # Sort by price
-        cheaper_options.sort(key=lambda x: x['price'])
-        
+        # STEP 4: Cheapest five in a single pass - no intermediate filtered
+        # list and no full sort just to take the head
+        cheaper_options = heapq.nsmallest(
+            MAX_PRODUCTS,
+            (p for p in matched_products if 0 < p['price'] < current_price),
+            key=lambda p: p['price']
+        )
+
         best_deal = cheaper_options[0] if cheaper_options else None
         total_time = time.time() - start_time
         
@@ -388,7 +524,7 @@ def compare_prices():
             'current_price': current_price,
             'current_site': current_site,
             'found_cheaper': len(cheaper_options) > 0,
-            'cheaper_options': cheaper_options[:5],
+            'cheaper_options': cheaper_options,
             'best_deal': best_deal,
             'savings': current_price - best_deal['price'] if best_deal else 0,
             'total_results': len(all_results),
@@ -403,23 +539,23 @@ def compare_prices():
         
         print(f'⏱️  Total: {total_time:.2f}s\n')
         
-        return jsonify(response)
+        return json_response(response)
         
     except Exception as e:
         print(f'❌ Error: {e}')
-        return jsonify({
+        return json_response({
             'success': False,
             'error': str(e)
-        }), 500
+        }, status=500)
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check"""
-    return jsonify({
+    return json_response({
         'status': 'ok',
         'service': 'Pak Buy Pro Scraping Server',
         'ai_server': AI_SERVER_URL,
-        'sites': ['PriceOye', 'Mega', 'Daraz'],
+        'sites': [spec['name'] for spec in SITES.values()],
         'mode': 'Performance B (Accurate)',
         'features': {
             'retry_logic': True,
@@ -432,7 +568,7 @@ def health():
 @app.route('/', methods=['GET'])
 def index():
     """Welcome page"""
-    return jsonify({
+    return json_response({
         'service': 'Pak Buy Pro Scraping Server',
         'version': '1.0.0',
         'mode': 'Performance B - High Accuracy',